@@ -1,103 +1,208 @@
 """SQLite database with FTS5 for memory storage and retrieval."""
 
+import atexit
+import re
 import sqlite3
 import os
+import threading
 import time
+from contextlib import contextmanager
 from typing import Optional
 
+_WORD_RE = re.compile(r"\w+")
+
+# One cached connection per (db_path, thread). Opening a connection runs
+# sqlite3.connect + PRAGMAs + makedirs, which is pure overhead on the hot
+# path for a WAL database that supports concurrent readers.
+_local = threading.local()
+_all_connections: list[sqlite3.Connection] = []
+_all_connections_lock = threading.Lock()
+
+# Pending last_accessed_at updates, batched so search queries don't pay a
+# WAL fsync for pure bookkeeping. Flushed once per flush interval by
+# whichever search crosses it.
+_pending_access: dict[str, set[int]] = {}
+_pending_access_lock = threading.Lock()
+_last_access_flush = 0.0
+_ACCESS_FLUSH_INTERVAL = 5.0
+
 
 def get_connection(db_path: str) -> sqlite3.Connection:
-    """Get a SQLite connection with WAL mode for concurrent reads."""
+    """Get a cached SQLite connection with WAL mode for concurrent reads.
+
+    Connections are cached per (db_path, thread) and configured once on
+    creation; callers must not close them.
+    """
+    cache: dict[str, sqlite3.Connection] = getattr(_local, "conn_cache", None)
+    if cache is None:
+        cache = {}
+        _local.conn_cache = cache
+
+    conn = cache.get(db_path)
+    if conn is not None:
+        return conn
+
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-64000")
+    # Wait out writer contention instead of raising "database is locked"
+    # when ingest and recall overlap
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.execute("PRAGMA wal_autocheckpoint=1000")
+
+    cache[db_path] = conn
+    with _all_connections_lock:
+        _all_connections.append(conn)
     return conn
 
 
+@atexit.register
+def _close_connections() -> None:
+    """Flush pending bookkeeping and close connections on interpreter exit."""
+    with _pending_access_lock:
+        to_flush = {path: pending for path, pending in _pending_access.items() if pending}
+        _pending_access.clear()
+    now = time.time()
+    for path, pending in to_flush.items():
+        try:
+            flush_access_times(path, pending, now)
+        except sqlite3.Error:
+            pass
+    with _all_connections_lock:
+        for conn in _all_connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _all_connections.clear()
+
+
+@contextmanager
+def bulk_write(db_path: str):
+    """Relax durability for a large write session (e.g. a backfill).
+
+    Sets synchronous=OFF on this thread's connection for the duration and
+    restores NORMAL after, so a bulk load pays no fsync per commit. A crash
+    mid-session can lose the most recent transactions but not corrupt a WAL
+    database. The journal mode is deliberately left on WAL: flipping it to
+    MEMORY fails while other connections hold the database open.
+    """
+    conn = get_connection(db_path)
+    conn.execute("PRAGMA synchronous=OFF")
+    try:
+        yield conn
+    finally:
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+
 def init_db(db_path: str) -> None:
     """Initialize the database schema."""
     conn = get_connection(db_path)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS memories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            topic TEXT NOT NULL,
+            fact TEXT NOT NULL,
+            source_session TEXT,
+            source_channel TEXT,
+            importance INTEGER DEFAULT 5,
+            created_at REAL NOT NULL,
+            last_accessed_at REAL
+        );
+
+        CREATE TABLE IF NOT EXISTS summaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            channel TEXT,
+            user_id TEXT,
+            summary TEXT NOT NULL,
+            message_count INTEGER,
+            created_at REAL NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_memories_topic ON memories(topic);
+        CREATE INDEX IF NOT EXISTS idx_memories_importance ON memories(importance DESC);
+        CREATE INDEX IF NOT EXISTS idx_memories_created ON memories(created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_memories_user_created
+            ON memories(user_id, created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_summaries_session ON summaries(session_id);
+        CREATE INDEX IF NOT EXISTS idx_summaries_user ON summaries(user_id);
+
+        -- Superseded by idx_memories_user_created, which serves both the
+        -- user filter and the created_at DESC ordering in one index walk
+        DROP INDEX IF EXISTS idx_memories_user;
+    """)
+
+    # Create FTS5 virtual table (separate because CREATE VIRTUAL TABLE
+    # doesn't support IF NOT EXISTS in all SQLite versions). v2 uses the
+    # trigram tokenizer (wrapped in porter) so substrings of identifiers
+    # like "AWS" or "GPT-4o" match inside larger tokens, which plain
+    # word-boundary tokenizers miss.
     try:
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS memories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT,
-                topic TEXT NOT NULL,
-                fact TEXT NOT NULL,
-                source_session TEXT,
-                source_channel TEXT,
-                importance INTEGER DEFAULT 5,
-                created_at REAL NOT NULL,
-                last_accessed_at REAL
-            );
-
-            CREATE TABLE IF NOT EXISTS summaries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                channel TEXT,
-                user_id TEXT,
-                summary TEXT NOT NULL,
-                message_count INTEGER,
-                created_at REAL NOT NULL
-            );
-
-            CREATE INDEX IF NOT EXISTS idx_memories_user ON memories(user_id);
-            CREATE INDEX IF NOT EXISTS idx_memories_topic ON memories(topic);
-            CREATE INDEX IF NOT EXISTS idx_memories_importance ON memories(importance DESC);
-            CREATE INDEX IF NOT EXISTS idx_memories_created ON memories(created_at DESC);
-            CREATE INDEX IF NOT EXISTS idx_summaries_session ON summaries(session_id);
-            CREATE INDEX IF NOT EXISTS idx_summaries_user ON summaries(user_id);
+        conn.execute("""
+            CREATE VIRTUAL TABLE memories_fts_v2 USING fts5(
+                user_id,
+                topic,
+                fact,
+                content=memories,
+                content_rowid=id,
+                tokenize='porter trigram'
+            )
         """)
+        fts_created = True
+    except sqlite3.OperationalError:
+        fts_created = False  # Already exists
 
-        # Create FTS5 virtual table (separate because CREATE VIRTUAL TABLE
-        # doesn't support IF NOT EXISTS in all SQLite versions)
-        try:
-            conn.execute("""
-                CREATE VIRTUAL TABLE memories_fts USING fts5(
-                    user_id,
-                    topic,
-                    fact,
-                    content=memories,
-                    content_rowid=id,
-                    tokenize='porter unicode61'
-                )
-            """)
-        except sqlite3.OperationalError:
-            pass  # Already exists
-
-        # Triggers to keep FTS5 in sync with memories table
-        for trigger_sql in [
-            """CREATE TRIGGER IF NOT EXISTS memories_ai AFTER INSERT ON memories BEGIN
-                INSERT INTO memories_fts(rowid, user_id, topic, fact)
-                VALUES (new.id, new.user_id, new.topic, new.fact);
-            END""",
-            """CREATE TRIGGER IF NOT EXISTS memories_ad AFTER DELETE ON memories BEGIN
-                INSERT INTO memories_fts(memories_fts, rowid, user_id, topic, fact)
-                VALUES ('delete', old.id, old.user_id, old.topic, old.fact);
-            END""",
-            """CREATE TRIGGER IF NOT EXISTS memories_au AFTER UPDATE ON memories BEGIN
-                INSERT INTO memories_fts(memories_fts, rowid, user_id, topic, fact)
-                VALUES ('delete', old.id, old.user_id, old.topic, old.fact);
-                INSERT INTO memories_fts(rowid, user_id, topic, fact)
-                VALUES (new.id, new.user_id, new.topic, new.fact);
-            END""",
+    if fts_created:
+        # One-time migration from the v1 table: drop the old vtable and its
+        # triggers, then repopulate v2 from the content table
+        for drop_sql in [
+            "DROP TRIGGER IF EXISTS memories_ai",
+            "DROP TRIGGER IF EXISTS memories_ad",
+            "DROP TRIGGER IF EXISTS memories_au",
+            "DROP TABLE IF EXISTS memories_fts",
         ]:
-            try:
-                conn.execute(trigger_sql)
-            except sqlite3.OperationalError:
-                pass  # Already exists
+            conn.execute(drop_sql)
+        conn.execute("""
+            INSERT INTO memories_fts_v2(rowid, user_id, topic, fact)
+            SELECT id, user_id, topic, fact FROM memories
+        """)
 
-        # Add embedding column (ALTER TABLE doesn't support IF NOT EXISTS)
+    # Triggers to keep FTS5 in sync with memories table
+    for trigger_sql in [
+        """CREATE TRIGGER IF NOT EXISTS memories_ai AFTER INSERT ON memories BEGIN
+            INSERT INTO memories_fts_v2(rowid, user_id, topic, fact)
+            VALUES (new.id, new.user_id, new.topic, new.fact);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS memories_ad AFTER DELETE ON memories BEGIN
+            INSERT INTO memories_fts_v2(memories_fts_v2, rowid, user_id, topic, fact)
+            VALUES ('delete', old.id, old.user_id, old.topic, old.fact);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS memories_au AFTER UPDATE ON memories BEGIN
+            INSERT INTO memories_fts_v2(memories_fts_v2, rowid, user_id, topic, fact)
+            VALUES ('delete', old.id, old.user_id, old.topic, old.fact);
+            INSERT INTO memories_fts_v2(rowid, user_id, topic, fact)
+            VALUES (new.id, new.user_id, new.topic, new.fact);
+        END""",
+    ]:
         try:
-            conn.execute("ALTER TABLE memories ADD COLUMN embedding BLOB")
+            conn.execute(trigger_sql)
         except sqlite3.OperationalError:
-            pass  # Column already exists
+            pass  # Already exists
 
-        conn.commit()
-    finally:
-        conn.close()
+    # Add embedding column (ALTER TABLE doesn't support IF NOT EXISTS)
+    try:
+        conn.execute("ALTER TABLE memories ADD COLUMN embedding BLOB")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+    conn.commit()
 
 
 def store_memories(db_path: str, memories: list[dict]) -> tuple[int, list[int]]:
@@ -105,31 +210,85 @@ def store_memories(db_path: str, memories: list[dict]) -> tuple[int, list[int]]:
     if not memories:
         return 0, []
     conn = get_connection(db_path)
+    now = time.time()
+    rows = [
+        (
+            mem.get("user_id"),
+            mem["topic"],
+            mem["fact"],
+            mem.get("source_session"),
+            mem.get("source_channel"),
+            mem.get("importance", 5),
+            now,
+        )
+        for mem in memories
+    ]
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        now = time.time()
-        count = 0
-        row_ids: list[int] = []
-        for mem in memories:
-            cursor = conn.execute(
-                """INSERT INTO memories (user_id, topic, fact, source_session,
-                   source_channel, importance, created_at)
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    mem.get("user_id"),
-                    mem["topic"],
-                    mem["fact"],
-                    mem.get("source_session"),
-                    mem.get("source_channel"),
-                    mem.get("importance", 5),
-                    now,
-                ),
-            )
-            row_ids.append(cursor.lastrowid)
-            count += 1
+        conn.executemany(
+            """INSERT INTO memories (user_id, topic, fact, source_session,
+               source_channel, importance, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            rows,
+        )
+        # AUTOINCREMENT rowids are monotone and assigned sequentially within
+        # a single transaction, so the batch occupies a contiguous range
+        # ending at last_insert_rowid().
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
         conn.commit()
-        return count, row_ids
-    finally:
-        conn.close()
+    except Exception:
+        conn.rollback()
+        raise
+    row_ids = list(range(last_id - len(rows) + 1, last_id + 1))
+    return len(rows), row_ids
+
+
+def store_memories_with_embeddings(
+        db_path: str, memories: list[dict],
+        blobs: list[Optional[bytes]]) -> tuple[int, list[int]]:
+    """Store memories and their embedding BLOBs in one transaction.
+
+    Takes parallel lists; a blob may be None when that fact's embedding
+    failed. A single commit covers both columns, so a crash can't leave
+    rows whose computed embedding was never written (the separate
+    store_memories + store_embeddings_batch path could). Returns
+    (count, list_of_row_ids) like store_memories.
+    """
+    if not memories:
+        return 0, []
+    conn = get_connection(db_path)
+    now = time.time()
+    rows = [
+        (
+            mem.get("user_id"),
+            mem["topic"],
+            mem["fact"],
+            mem.get("source_session"),
+            mem.get("source_channel"),
+            mem.get("importance", 5),
+            blob,
+            now,
+        )
+        for mem, blob in zip(memories, blobs)
+    ]
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            """INSERT INTO memories (user_id, topic, fact, source_session,
+               source_channel, importance, embedding, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            rows,
+        )
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    row_ids = list(range(last_id - len(rows) + 1, last_id + 1))
+    for memory_id, blob in zip(row_ids, blobs):
+        if blob is not None:
+            _index_embedding(db_path, memory_id, blob)
+    return len(rows), row_ids
 
 
 def store_summary(db_path: str, session_id: str, channel: Optional[str],
@@ -137,17 +296,41 @@ def store_summary(db_path: str, session_id: str, channel: Optional[str],
                   message_count: int) -> int:
     """Store a session summary. Returns the summary ID."""
     conn = get_connection(db_path)
-    try:
-        cursor = conn.execute(
-            """INSERT INTO summaries (session_id, channel, user_id, summary,
-               message_count, created_at)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (session_id, channel, user_id, summary, message_count, time.time()),
-        )
-        conn.commit()
-        return cursor.lastrowid
-    finally:
-        conn.close()
+    cursor = conn.execute(
+        """INSERT INTO summaries (session_id, channel, user_id, summary,
+           message_count, created_at)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        (session_id, channel, user_id, summary, message_count, time.time()),
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+
+def _search_memories_like(db_path: str, words: list[str],
+                          user_id: Optional[str], limit: int) -> list[dict]:
+    """Substring fallback for queries with no trigram-capable term.
+
+    The trigram tokenizer can never match 1-2 character tokens, so queries
+    like "go" or "C" scan the base table with LIKE instead of returning
+    nothing. No bm25 is available here; rank is a constant -1.0 so callers'
+    normalization still works, with importance/recency as the ordering.
+    """
+    conn = get_connection(db_path)
+    clause = " OR ".join("(m.fact LIKE ? OR m.topic LIKE ?)" for _ in words)
+    params: list = []
+    for word in words:
+        params.extend((f"%{word}%", f"%{word}%"))
+    sql = f"""SELECT m.id, m.user_id, m.topic, m.fact, m.importance,
+                     m.created_at, m.source_session, m.source_channel,
+                     -1.0 AS rank
+              FROM memories m
+              WHERE ({clause})"""
+    if user_id:
+        sql += " AND m.user_id = ?"
+        params.append(user_id)
+    sql += " ORDER BY m.importance DESC, m.created_at DESC LIMIT ?"
+    params.append(limit)
+    return [dict(row) for row in conn.execute(sql, params).fetchall()]
 
 
 def search_memories(db_path: str, query: str,
@@ -155,165 +338,291 @@ def search_memories(db_path: str, query: str,
                     limit: int = 20) -> list[dict]:
     """Search memories using FTS5. Returns matching memories ranked by relevance."""
     conn = get_connection(db_path)
-    try:
-        # Build FTS5 query - tokenize into individual words, strip punctuation
-        import re
-        words = re.findall(r'\w+', query)
-        if not words:
-            return []
-        # Quote each word to avoid FTS5 syntax issues, join with OR for broad matching
-        fts_query = " OR ".join(f'"{w}"' for w in words)
-
-        if user_id:
-            rows = conn.execute(
-                """SELECT m.id, m.user_id, m.topic, m.fact, m.importance,
-                          m.created_at, m.source_session, m.source_channel,
-                          rank
-                   FROM memories_fts fts
-                   JOIN memories m ON m.id = fts.rowid
-                   WHERE memories_fts MATCH ?
-                     AND m.user_id = ?
-                   ORDER BY rank
-                   LIMIT ?""",
-                (fts_query, user_id, limit),
-            ).fetchall()
-        else:
-            rows = conn.execute(
-                """SELECT m.id, m.user_id, m.topic, m.fact, m.importance,
-                          m.created_at, m.source_session, m.source_channel,
-                          rank
-                   FROM memories_fts fts
-                   JOIN memories m ON m.id = fts.rowid
-                   WHERE memories_fts MATCH ?
+    # Build FTS5 query - tokenize into individual words, strip punctuation
+    words = _WORD_RE.findall(query)
+    if not words:
+        return []
+    # The trigram tokenizer indexes nothing shorter than 3 characters, so
+    # sub-trigram terms can't match; drop them from the MATCH and fall back
+    # to a LIKE scan when the query has no trigram-capable term at all
+    long_words = [w for w in words if len(w) >= 3]
+    if not long_words:
+        results = _search_memories_like(db_path, words, user_id, limit)
+        if results:
+            _record_access(db_path, [r["id"] for r in results])
+        return results
+    # Quote each word to avoid FTS5 syntax issues, join with OR for broad matching
+    fts_query = " OR ".join(f'"{w}"' for w in long_words)
+
+    if user_id:
+        # Run the MATCH alone in a materialized CTE, then filter by user_id
+        # on the candidate set. Mixing the MATCH with extra predicates on the
+        # joined table makes SQLite abandon the FTS5 index and scan. The CTE
+        # oversamples 10x so enough candidates survive the user filter.
+        rows = conn.execute(
+            """WITH fts_matches AS (
+                   SELECT rowid, bm25(memories_fts_v2, 0.5, 1.0, 3.0) AS rank
+                   FROM memories_fts_v2
+                   WHERE memories_fts_v2 MATCH ?
                    ORDER BY rank
-                   LIMIT ?""",
-                (fts_query, limit),
-            ).fetchall()
+                   LIMIT ?
+               )
+               SELECT m.id, m.user_id, m.topic, m.fact, m.importance,
+                      m.created_at, m.source_session, m.source_channel,
+                      fm.rank
+               FROM fts_matches fm
+               JOIN memories m ON m.id = fm.rowid
+               WHERE m.user_id = ?
+               ORDER BY fm.rank
+               LIMIT ?""",
+            (fts_query, limit * 10, user_id, limit),
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            """SELECT m.id, m.user_id, m.topic, m.fact, m.importance,
+                      m.created_at, m.source_session, m.source_channel,
+                      bm25(memories_fts_v2, 0.5, 1.0, 3.0) AS rank
+               FROM memories_fts_v2 fts
+               JOIN memories m ON m.id = fts.rowid
+               WHERE memories_fts_v2 MATCH ?
+               ORDER BY rank
+               LIMIT ?""",
+            (fts_query, limit),
+        ).fetchall()
 
-        results = [dict(row) for row in rows]
+    results = [dict(row) for row in rows]
 
-        # Update last_accessed_at for retrieved memories
-        if results:
-            now = time.time()
-            ids = [r["id"] for r in results]
-            placeholders = ",".join("?" * len(ids))
-            conn.execute(
-                f"UPDATE memories SET last_accessed_at = ? WHERE id IN ({placeholders})",
-                [now] + ids,
-            )
-            conn.commit()
+    # Record last_accessed_at updates for later batch flush instead of
+    # doubling query latency with an UPDATE + commit here
+    if results:
+        _record_access(db_path, [r["id"] for r in results])
+
+    return results
+
+
+def _record_access(db_path: str, ids: list[int]) -> None:
+    """Queue last_accessed_at updates; flush past the flush interval."""
+    global _last_access_flush
+    now = time.time()
+    with _pending_access_lock:
+        _pending_access.setdefault(db_path, set()).update(ids)
+        if now - _last_access_flush < _ACCESS_FLUSH_INTERVAL:
+            return
+        _last_access_flush = now
+        to_flush = {path: pending for path, pending in _pending_access.items() if pending}
+        _pending_access.clear()
+
+    for path, pending in to_flush.items():
+        flush_access_times(path, pending, now)
 
-        return results
-    finally:
-        conn.close()
+
+def flush_access_times(db_path: str, ids: set[int], ts: float) -> None:
+    """Write queued last_accessed_at updates in one transaction."""
+    if not ids:
+        return
+    conn = get_connection(db_path)
+    id_list = list(ids)
+    placeholders = ",".join("?" * len(id_list))
+    conn.execute(
+        f"UPDATE memories SET last_accessed_at = ? WHERE id IN ({placeholders})",
+        [ts] + id_list,
+    )
+    conn.commit()
 
 
 def get_recent_memories(db_path: str, user_id: Optional[str] = None,
                         limit: int = 10) -> list[dict]:
     """Get most recent memories, optionally filtered by user."""
     conn = get_connection(db_path)
-    try:
-        if user_id:
-            rows = conn.execute(
-                """SELECT id, user_id, topic, fact, importance, created_at,
-                          source_session, source_channel
-                   FROM memories
-                   WHERE user_id = ?
-                   ORDER BY created_at DESC
-                   LIMIT ?""",
-                (user_id, limit),
-            ).fetchall()
-        else:
-            rows = conn.execute(
-                """SELECT id, user_id, topic, fact, importance, created_at,
-                          source_session, source_channel
-                   FROM memories
-                   ORDER BY created_at DESC
-                   LIMIT ?""",
-                (limit,),
-            ).fetchall()
-        return [dict(row) for row in rows]
-    finally:
-        conn.close()
+    if user_id:
+        rows = conn.execute(
+            """SELECT id, user_id, topic, fact, importance, created_at,
+                      source_session, source_channel
+               FROM memories
+               WHERE user_id = ?
+               ORDER BY created_at DESC
+               LIMIT ?""",
+            (user_id, limit),
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            """SELECT id, user_id, topic, fact, importance, created_at,
+                      source_session, source_channel
+               FROM memories
+               ORDER BY created_at DESC
+               LIMIT ?""",
+            (limit,),
+        ).fetchall()
+    return [dict(row) for row in rows]
 
 
 def store_embedding(db_path: str, memory_id: int, embedding_blob: bytes) -> bool:
     """Store a precomputed embedding BLOB for a memory. Returns True on success."""
     conn = get_connection(db_path)
+    conn.execute(
+        "UPDATE memories SET embedding = ? WHERE id = ?",
+        (embedding_blob, memory_id),
+    )
+    conn.commit()
+    _index_embedding(db_path, memory_id, embedding_blob)
+    return True
+
+
+def store_embeddings_batch(db_path: str,
+                           embeddings: list[tuple[int, bytes]]) -> int:
+    """Store embedding BLOBs for many memories in one transaction.
+
+    Takes (memory_id, blob) pairs; one commit instead of one connection
+    round trip + fsync per embedding. Returns the number stored.
+    """
+    if not embeddings:
+        return 0
+    conn = get_connection(db_path)
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        conn.execute(
+        conn.executemany(
             "UPDATE memories SET embedding = ? WHERE id = ?",
-            (embedding_blob, memory_id),
+            [(blob, memory_id) for memory_id, blob in embeddings],
         )
         conn.commit()
-        return True
-    finally:
-        conn.close()
+    except Exception:
+        conn.rollback()
+        raise
+    for memory_id, blob in embeddings:
+        _index_embedding(db_path, memory_id, blob)
+    return len(embeddings)
 
 
-def get_memories_with_embeddings(db_path: str, user_id: Optional[str] = None,
-                                  limit: int = 500) -> list[dict]:
-    """Get memories that have embeddings, optionally filtered by user."""
-    conn = get_connection(db_path)
-    try:
-        if user_id:
-            rows = conn.execute(
-                """SELECT id, user_id, topic, fact, importance, created_at,
-                          source_session, source_channel, embedding
-                   FROM memories
-                   WHERE embedding IS NOT NULL AND user_id = ?
-                   ORDER BY created_at DESC
-                   LIMIT ?""",
-                (user_id, limit),
-            ).fetchall()
-        else:
-            rows = conn.execute(
-                """SELECT id, user_id, topic, fact, importance, created_at,
-                          source_session, source_channel, embedding
-                   FROM memories
-                   WHERE embedding IS NOT NULL
-                   ORDER BY created_at DESC
-                   LIMIT ?""",
-                (limit,),
-            ).fetchall()
-        return [dict(row) for row in rows]
-    finally:
-        conn.close()
+def _index_embedding(db_path: str, memory_id: int, embedding_blob: bytes) -> None:
+    """Keep the in-process vector index in sync with a stored embedding."""
+    from . import vecindex
+    from .embeddings import deserialize_embedding
 
+    vec = deserialize_embedding(embedding_blob)
+    if vec is not None:
+        vecindex.get_index(db_path).add(memory_id, vec)
 
-def get_memories_without_embeddings(db_path: str) -> list[dict]:
-    """Get all memories that do not yet have an embedding."""
+
+def get_memories_with_embeddings(db_path: str, user_id: Optional[str] = None,
+                                  limit: Optional[int] = 500) -> list[dict]:
+    """Get memories that have embeddings, optionally filtered by user.
+
+    Pass limit=None for the full store (used to build the vector index).
+    """
     conn = get_connection(db_path)
-    try:
+    if user_id:
         rows = conn.execute(
             """SELECT id, user_id, topic, fact, importance, created_at,
-                      source_session, source_channel
+                      source_session, source_channel, embedding
                FROM memories
-               WHERE embedding IS NULL
-               ORDER BY id""",
+               WHERE embedding IS NOT NULL AND user_id = ?
+               ORDER BY created_at DESC
+               LIMIT ?""",
+            (user_id, -1 if limit is None else limit),
         ).fetchall()
-        return [dict(row) for row in rows]
-    finally:
-        conn.close()
+    else:
+        rows = conn.execute(
+            """SELECT id, user_id, topic, fact, importance, created_at,
+                      source_session, source_channel, embedding
+               FROM memories
+               WHERE embedding IS NOT NULL
+               ORDER BY created_at DESC
+               LIMIT ?""",
+            (-1 if limit is None else limit),
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def get_memories_by_ids(db_path: str, ids: list[int]) -> list[dict]:
+    """Fetch memories by id, preserving the input order."""
+    if not ids:
+        return []
+    conn = get_connection(db_path)
+    placeholders = ",".join("?" * len(ids))
+    rows = conn.execute(
+        f"""SELECT id, user_id, topic, fact, importance, created_at,
+                   source_session, source_channel
+            FROM memories
+            WHERE id IN ({placeholders})""",
+        ids,
+    ).fetchall()
+    by_id = {row["id"]: dict(row) for row in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def get_embedding_rows(db_path: str, since_id: int = 0) -> list[dict]:
+    """Get (id, embedding) rows ordered by id, optionally above since_id.
+
+    Slim variant for the vector index: skips the scalar columns so an index
+    (re)build doesn't drag the whole memories table through the pager.
+    """
+    conn = get_connection(db_path)
+    rows = conn.execute(
+        """SELECT id, embedding FROM memories
+           WHERE embedding IS NOT NULL AND id > ?
+           ORDER BY id""",
+        (since_id,),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def count_embeddings(db_path: str, up_to_id: Optional[int] = None) -> int:
+    """Count memories with embeddings, optionally only ids <= up_to_id."""
+    conn = get_connection(db_path)
+    if up_to_id is None:
+        row = conn.execute(
+            "SELECT COUNT(*) FROM memories WHERE embedding IS NOT NULL"
+        ).fetchone()
+    else:
+        row = conn.execute(
+            "SELECT COUNT(*) FROM memories WHERE embedding IS NOT NULL AND id <= ?",
+            (up_to_id,),
+        ).fetchone()
+    return row[0]
+
+
+def get_memories_without_embeddings(db_path: str) -> list[dict]:
+    """Get all memories that do not yet have an embedding."""
+    conn = get_connection(db_path)
+    rows = conn.execute(
+        """SELECT id, user_id, topic, fact, importance, created_at,
+                  source_session, source_channel
+           FROM memories
+           WHERE embedding IS NULL
+           ORDER BY id""",
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def optimize_fts(db_path: str) -> None:
+    """Merge FTS5 index segments and refresh planner statistics.
+
+    FTS5's segment count grows with inserts; MATCH results stay correct but
+    queries slow down as segments pile up. Safe to run at any time and cheap
+    when there is little to merge, so ingestion calls this after large
+    batches.
+    """
+    conn = get_connection(db_path)
+    conn.execute("INSERT INTO memories_fts_v2(memories_fts_v2) VALUES('optimize')")
+    conn.execute("PRAGMA optimize")
+    conn.commit()
 
 
 def get_stats(db_path: str) -> dict:
     """Get database statistics."""
     conn = get_connection(db_path)
-    try:
-        memory_count = conn.execute("SELECT COUNT(*) FROM memories").fetchone()[0]
-        summary_count = conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
-        unique_users = conn.execute(
-            "SELECT COUNT(DISTINCT user_id) FROM memories WHERE user_id IS NOT NULL"
-        ).fetchone()[0]
-        unique_topics = conn.execute(
-            "SELECT COUNT(DISTINCT topic) FROM memories"
-        ).fetchone()[0]
-        return {
-            "total_memories": memory_count,
-            "total_summaries": summary_count,
-            "unique_users": unique_users,
-            "unique_topics": unique_topics,
-        }
-    finally:
-        conn.close()
+    # One statement with scalar subqueries instead of four prep/exec cycles
+    row = conn.execute(
+        """SELECT
+               (SELECT COUNT(*) FROM memories),
+               (SELECT COUNT(*) FROM summaries),
+               (SELECT COUNT(DISTINCT user_id) FROM memories
+                WHERE user_id IS NOT NULL),
+               (SELECT COUNT(DISTINCT topic) FROM memories)"""
+    ).fetchone()
+    return {
+        "total_memories": row[0],
+        "total_summaries": row[1],
+        "unique_users": row[2],
+        "unique_topics": row[3],
+    }
@@ -0,0 +1,50 @@
+"""Shared httpx client so service calls reuse pooled connections."""
+
+import asyncio
+import atexit
+import logging
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger("memory-cortex.httpclient")
+
+DEFAULT_TIMEOUT = 120.0
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Get the process-wide AsyncClient, creating it on first use.
+
+    Opening a client per request (the old `async with AsyncClient()`
+    pattern) tears down the keep-alive pool every call, paying DNS + TCP
+    setup per request. One shared client keeps connections to the embed
+    service and llama-server warm. Callers pass per-request timeouts.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        )
+    return _client
+
+
+async def aclose() -> None:
+    """Close the shared client (for app shutdown hooks)."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+@atexit.register
+def _close_on_exit() -> None:
+    """Best-effort close on interpreter exit if no loop is running."""
+    if _client is None or _client.is_closed:
+        return
+    try:
+        asyncio.run(aclose())
+    except RuntimeError:
+        pass  # Event loop already running or closed; sockets die with us
@@ -1,14 +1,24 @@
 """Conversation ingestion: chunk conversations and extract facts via the memory model."""
 
+import asyncio
+import itertools
 import json
 import logging
 import re
+from bisect import bisect_left, bisect_right
 from typing import Optional
 
 import httpx
 
+from .httpclient import get_client
+
 logger = logging.getLogger("memory-cortex.ingestion")
 
+_THINK_RE = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+# Merge FTS5 segments after ingests that stored at least this many facts
+FTS_OPTIMIZE_THRESHOLD = 100
+
 EXTRACTION_PROMPT = """You are a memory extraction system. Given a conversation snippet, extract discrete facts worth remembering long-term.
 
 For each fact, output a JSON array of objects with these fields:
@@ -27,117 +37,131 @@ Rules:
 Output ONLY the JSON array, nothing else. /no_think"""
 
 
-def chunk_conversation(messages: list[dict], chunk_size: int = 2048,
-                       overlap: int = 256) -> list[list[dict]]:
-    """Split a conversation into overlapping chunks.
+# Prepped message: (display name, content, approximate size in chars)
+_MsgTuple = tuple[str, str, int]
 
-    Uses a simple character-based approximation (4 chars ~= 1 token).
+
+def prep_messages(messages: list[dict]) -> list[_MsgTuple]:
+    """Extract (name, content, size) tuples from raw messages in one pass.
+
+    Drops messages without content and resolves the display name and size
+    once, so chunking and formatting don't re-read the dicts.
+    """
+    return [
+        (
+            msg.get("name") or msg.get("role", "unknown"),
+            content,
+            len(content) + len(msg.get("role", "")) + 10,  # overhead
+        )
+        for msg in messages
+        if (content := msg.get("content"))
+    ]
+
+
+def chunk_conversation(messages: list[_MsgTuple], chunk_size: int = 2048,
+                       overlap: int = 256) -> list[list[_MsgTuple]]:
+    """Split a prepped conversation into overlapping chunks.
+
+    Uses a simple character-based approximation (4 chars ~= 1 token) over a
+    prefix sum of message sizes, so each chunk boundary and each overlap
+    start is found by binary search instead of rescanning the chunk tail -
+    O(N log N) overall where the old rescan was quadratic in the worst case.
     """
+    if not messages:
+        return []
+
     chars_per_token = 4
     max_chars = chunk_size * chars_per_token
     overlap_chars = overlap * chars_per_token
 
+    # cum[i] = total size of messages[:i]
+    cum = [0]
+    cum.extend(itertools.accumulate(size for _, _, size in messages))
+
     chunks = []
-    current_chunk = []
-    current_size = 0
-
-    for msg in messages:
-        content = msg.get("content", "")
-        msg_size = len(content) + len(msg.get("role", "")) + 10  # overhead
-
-        if current_size + msg_size > max_chars and current_chunk:
-            chunks.append(current_chunk)
-            # Keep overlap from end of current chunk
-            overlap_chunk = []
-            overlap_size = 0
-            for m in reversed(current_chunk):
-                m_size = len(m.get("content", "")) + 10
-                if overlap_size + m_size > overlap_chars:
-                    break
-                overlap_chunk.insert(0, m)
-                overlap_size += m_size
-            current_chunk = overlap_chunk
-            current_size = overlap_size
-
-        current_chunk.append(msg)
-        current_size += msg_size
-
-    if current_chunk:
-        chunks.append(current_chunk)
+    n = len(messages)
+    start = 0
+    while start < n:
+        # Furthest end index keeping the chunk within max_chars; always take
+        # at least one message so oversized messages still progress
+        end = bisect_right(cum, cum[start] + max_chars) - 1
+        if end <= start:
+            end = start + 1
+        chunks.append(messages[start:end])
+        if end >= n:
+            break
+        # Overlap: earliest index whose suffix within this chunk fits the
+        # overlap budget, i.e. cum[end] - cum[i] <= overlap_chars
+        overlap_start = bisect_left(cum, cum[end] - overlap_chars)
+        start = min(max(overlap_start, start + 1), end)
 
     return chunks
 
 
-def format_chunk_for_extraction(chunk: list[dict]) -> str:
-    """Format a conversation chunk as text for the extraction model."""
-    lines = []
-    for msg in chunk:
-        role = msg.get("role", "unknown")
-        name = msg.get("name", role)
-        content = msg.get("content", "")
-        if content:
-            lines.append(f"[{name}]: {content}")
-    return "\n".join(lines)
+def format_chunk_for_extraction(chunk: list[_MsgTuple]) -> str:
+    """Format a prepped conversation chunk as text for the extraction model."""
+    return "\n".join(f"[{name}]: {content}" for name, content, _ in chunk)
 
 
 async def extract_facts(base_url: str, chunk_text: str,
                         session_id: Optional[str] = None,
                         channel: Optional[str] = None) -> list[dict]:
     """Send a conversation chunk to the memory model and extract facts."""
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        try:
-            response = await client.post(
-                f"{base_url}/chat/completions",
-                json={
-                    "model": "memory",
-                    "messages": [
-                        {"role": "system", "content": EXTRACTION_PROMPT},
-                        {"role": "user", "content": chunk_text},
-                    ],
-                    "temperature": 0.1,
-                    "max_tokens": 2048,
-                },
-            )
-            response.raise_for_status()
-            data = response.json()
-
-            msg = data["choices"][0]["message"]
-            content = msg.get("content") or msg.get("reasoning_content") or ""
-
-            # Strip thinking tags if present (Qwen3 thinking mode fallback)
-            content = re.sub(r"<think>.*?</think>", "", content, flags=re.DOTALL).strip()
-
-            # Parse JSON from response
-            # Handle markdown code blocks
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
-
-            facts = json.loads(content)
-
-            if not isinstance(facts, list):
-                logger.warning("Model returned non-list: %s", type(facts))
-                return []
-
-            # Attach source metadata
-            for fact in facts:
-                fact["source_session"] = session_id
-                fact["source_channel"] = channel
-
-            return facts
-
-        except json.JSONDecodeError as e:
-            logger.error("Failed to parse model output as JSON: %s", e)
-            logger.debug("Raw output: %s", content if 'content' in dir() else "N/A")
-            return []
-        except httpx.HTTPError as e:
-            logger.error("HTTP error calling memory model: %s", e)
-            return []
-        except Exception as e:
-            logger.error("Unexpected error during extraction: %s", e)
+    client = get_client()
+    try:
+        response = await client.post(
+            f"{base_url}/chat/completions",
+            json={
+                "model": "memory",
+                "messages": [
+                    {"role": "system", "content": EXTRACTION_PROMPT},
+                    {"role": "user", "content": chunk_text},
+                ],
+                "temperature": 0.1,
+                "max_tokens": 2048,
+            },
+            timeout=120.0,
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        msg = data["choices"][0]["message"]
+        content = msg.get("content") or msg.get("reasoning_content") or ""
+
+        # Strip thinking tags if present (Qwen3 thinking mode fallback)
+        content = _THINK_RE.sub("", content).strip()
+
+        # Parse JSON from response
+        # Handle markdown code blocks
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0].strip()
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0].strip()
+
+        facts = json.loads(content)
+
+        if not isinstance(facts, list):
+            logger.warning("Model returned non-list: %s", type(facts))
             return []
 
+        # Attach source metadata
+        for fact in facts:
+            fact["source_session"] = session_id
+            fact["source_channel"] = channel
+
+        return facts
+
+    except json.JSONDecodeError as e:
+        logger.error("Failed to parse model output as JSON: %s", e)
+        logger.debug("Raw output: %s", content if 'content' in dir() else "N/A")
+        return []
+    except httpx.HTTPError as e:
+        logger.error("HTTP error calling memory model: %s", e)
+        return []
+    except Exception as e:
+        logger.error("Unexpected error during extraction: %s", e)
+        return []
+
 
 async def ingest_conversation(base_url: str, db_path: str,
                               messages: list[dict],
@@ -149,47 +173,79 @@ async def ingest_conversation(base_url: str, db_path: str,
                               config: dict | None = None) -> dict:
     """Full ingestion pipeline: chunk, extract, store, embed."""
     from . import db
-    from .embeddings import compute_embedding, serialize_embedding
+    from .embeddings import compute_embeddings_batch, serialize_embedding
 
-    # Filter to only user messages and assistant responses with content
-    relevant = [m for m in messages if m.get("content")]
+    # One pass: drop empty messages and resolve name/content/size up front
+    prepped = prep_messages(messages)
 
-    if not relevant:
+    if not prepped:
         return {"chunks": 0, "facts_extracted": 0, "facts_stored": 0, "facts_embedded": 0}
 
-    chunks = chunk_conversation(relevant, chunk_size, chunk_overlap)
-    total_extracted = 0
-    total_stored = 0
+    chunks = chunk_conversation(prepped, chunk_size, chunk_overlap)
     total_embedded = 0
 
     embed_url = (config or {}).get("embeddings", {}).get("url", "http://localhost:8105/embed")
+    max_concurrent = (config or {}).get("ingestion", {}).get("max_concurrent", 2)
+
+    # Extraction is network-bound on the memory model; run chunks
+    # concurrently, bounded so the llama-server isn't flooded
+    sem = asyncio.Semaphore(max_concurrent)
+
+    async def extract_one(chunk: list[_MsgTuple]) -> list[dict]:
+        async with sem:
+            chunk_text = format_chunk_for_extraction(chunk)
+            return await extract_facts(base_url, chunk_text, session_id, channel)
+
+    fact_lists = await asyncio.gather(*(extract_one(chunk) for chunk in chunks))
+    facts = [fact for chunk_facts in fact_lists for fact in chunk_facts]
+    total_extracted = len(facts)
+
+    # Override user_id if provided (for DM sessions where we know the user)
+    if user_id:
+        for fact in facts:
+            fact["user_id"] = user_id
+
+    # Embedding texts don't depend on rowids, so compute them before the
+    # insert and write facts + embeddings in one transaction: no orphaned
+    # rows if the process dies between the two writes, and one fsync total
+    blobs: list[Optional[bytes]] = [None] * len(facts)
+    if facts:
+        texts = [f"{fact.get('topic', '')}: {fact.get('fact', '')}"
+                 for fact in facts]
+        try:
+            embeddings = await compute_embeddings_batch(texts, embed_url)
+        except Exception as e:
+            logger.error("Failed to compute embeddings batch: %s", e)
+            embeddings = [None] * len(facts)
+
+        for i, embedding in enumerate(embeddings):
+            if embedding:
+                blobs[i] = serialize_embedding(embedding)
+            else:
+                logger.warning("No embedding for fact %d of %d", i + 1, len(facts))
+
+    # The insert can block up to busy_timeout under writer contention;
+    # keep it off the event loop like the other db calls
+    total_stored, _stored_ids = await asyncio.to_thread(
+        db.store_memories_with_embeddings, db_path, facts, blobs
+    )
+    total_embedded = sum(1 for blob in blobs if blob is not None)
 
-    for chunk in chunks:
-        chunk_text = format_chunk_for_extraction(chunk)
-        facts = await extract_facts(base_url, chunk_text, session_id, channel)
-
-        # Override user_id if provided (for DM sessions where we know the user)
-        if user_id:
-            for fact in facts:
-                fact["user_id"] = user_id
-
-        stored_count, stored_ids = db.store_memories(db_path, facts)
-        total_extracted += len(facts)
-        total_stored += stored_count
-
-        # Compute and store embeddings for newly inserted facts
-        for fact, fid in zip(facts, stored_ids):
-            text = f"{fact.get('topic', '')}: {fact.get('fact', '')}"
-            try:
-                embedding = await compute_embedding(text, embed_url)
-                if embedding:
-                    blob = serialize_embedding(embedding)
-                    db.store_embedding(db_path, fid, blob)
-                    total_embedded += 1
-                else:
-                    logger.warning("No embedding returned for memory %d", fid)
-            except Exception as e:
-                logger.error("Failed to embed memory %d: %s", fid, e)
+    # Persist the vector index so the next restart memmaps it instead of
+    # re-deserializing every blob
+    if total_embedded:
+        from . import vecindex
+        try:
+            await asyncio.to_thread(vecindex.save_index, db_path)
+        except Exception as e:
+            logger.warning("Vector index save failed: %s", e)
+
+    # Large ingests fragment the FTS5 segment structure; merge it back down
+    if total_stored >= FTS_OPTIMIZE_THRESHOLD:
+        try:
+            await asyncio.to_thread(db.optimize_fts, db_path)
+        except Exception as e:
+            logger.warning("FTS optimize failed: %s", e)
 
     logger.info(
         "Ingested %d chunks, extracted %d facts, stored %d, embedded %d",
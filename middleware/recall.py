@@ -1,15 +1,29 @@
 """Memory recall: search stored memories and synthesize a response."""
 
+import asyncio
+import heapq
 import json
 import logging
 import re
+from collections import defaultdict
 from datetime import datetime
 from typing import Optional
 
 import httpx
 
+from .httpclient import get_client
+
 logger = logging.getLogger("memory-cortex.recall")
 
+_THINK_RE = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+# Reciprocal Rank Fusion parameters: score = sum(weight / (RRF_K + rank)).
+# The vector leg is weighted higher because paraphrase queries dominate
+# recall traffic; BM25 still carries exact names/dates.
+RRF_K = 10
+RRF_VEC_WEIGHT = 0.7
+RRF_BM25_WEIGHT = 0.3
+
 SYNTHESIS_PROMPT = """You are a memory recall assistant. You have been given a query and a set of stored memories about the user(s). Your job is to synthesize a clear, relevant response from these memories.
 
 Rules:
@@ -27,21 +41,74 @@ async def recall_memories(base_url: str, db_path: str, query: str,
                           user_id: Optional[str] = None,
                           top_k: int = 8,
                           max_results: int = 20,
-                          max_synthesis_tokens: int = 1024) -> dict:
+                          max_synthesis_tokens: int = 1024,
+                          embed_url: Optional[str] = None) -> dict:
     """Search memories and synthesize a response.
 
+    Runs BM25 (FTS5) and vector kNN in parallel and fuses the two ranked
+    lists with Reciprocal Rank Fusion, so paraphrase queries (vector-strong)
+    and exact name/date queries (BM25-strong) both recall well. Falls back
+    to BM25-only when the embedding service is down, and to recent memories
+    when both legs come back empty.
+
     Returns:
         dict with 'response' (synthesized text), 'memories_searched' (count),
         'memories_used' (count of memories sent to model)
     """
     from . import db as memdb
+    from . import vecindex
+    from .embeddings import DEFAULT_EMBED_URL, compute_embedding
+
+    # BM25 and the query embedding have no data dependency - overlap them
+    fts_results, query_embedding = await asyncio.gather(
+        asyncio.to_thread(
+            memdb.search_memories, db_path, query, user_id, max_results
+        ),
+        compute_embedding(query, embed_url or DEFAULT_EMBED_URL),
+    )
 
-    # Search FTS5
-    results = memdb.search_memories(db_path, query, user_id=user_id, limit=max_results)
+    vec_hits: list[tuple[int, float]] = []
+    if query_embedding is not None:
+        # The index isn't user-partitioned; filtered recalls oversample so
+        # the requesting user's rows survive once other users' hits drop
+        k = max_results * 10 if user_id else max_results
+        vec_hits = await asyncio.to_thread(
+            vecindex.ann_search, db_path, query_embedding, k
+        )
+
+    # Hydrate vector-only hits (FTS rows are already in hand) so the user
+    # filter applies before fusion - filtering after the top-k cut lets
+    # other users' hits crowd out the requesting user's entirely
+    fts_by_id = {row["id"]: row for row in fts_results}
+    unknown = [mid for mid, _sim in vec_hits if mid not in fts_by_id]
+    if unknown:
+        for row in await asyncio.to_thread(
+                memdb.get_memories_by_ids, db_path, unknown):
+            fts_by_id[row["id"]] = row
+    if user_id:
+        vec_hits = [
+            (mid, sim) for mid, sim in vec_hits
+            if (row := fts_by_id.get(mid)) and row.get("user_id") == user_id
+        ]
+
+    # Reciprocal Rank Fusion over the two (user-filtered) ranked lists
+    rrf: dict[int, float] = defaultdict(float)
+    for rank, row in enumerate(fts_results, start=1):
+        rrf[row["id"]] += RRF_BM25_WEIGHT / (RRF_K + rank)
+    for rank, (mid, _sim) in enumerate(vec_hits, start=1):
+        rrf[mid] += RRF_VEC_WEIGHT / (RRF_K + rank)
+
+    # Only max_results candidates survive into synthesis; a bounded heap
+    # selection beats sorting the full fused pool
+    fused_ids = heapq.nlargest(max_results, rrf, key=rrf.get)
+
+    results = [fts_by_id[mid] for mid in fused_ids if mid in fts_by_id]
 
     if not results:
-        # Fall back to recent memories if FTS5 returns nothing
-        results = memdb.get_recent_memories(db_path, user_id=user_id, limit=top_k)
+        # Fall back to recent memories if both legs return nothing
+        results = await asyncio.to_thread(
+            memdb.get_recent_memories, db_path, user_id=user_id, limit=top_k
+        )
 
     if not results:
         return {
@@ -93,32 +160,33 @@ Stored memories:
 
 Based on these memories, provide a relevant response to the query."""
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        try:
-            response = await client.post(
-                f"{base_url}/chat/completions",
-                json={
-                    "model": "memory",
-                    "messages": [
-                        {"role": "system", "content": SYNTHESIS_PROMPT},
-                        {"role": "user", "content": user_message},
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": max_tokens,
-                },
-            )
-            response.raise_for_status()
-            data = response.json()
-
-            msg = data["choices"][0]["message"]
-            content = msg.get("content") or msg.get("reasoning_content") or ""
-            # Strip thinking tags if present (fallback)
-            content = re.sub(r"<think>.*?</think>", "", content, flags=re.DOTALL).strip()
-            return content
-
-        except httpx.HTTPError as e:
-            logger.error("HTTP error during synthesis: %s", e)
-            return f"Error recalling memories: {e}"
-        except Exception as e:
-            logger.error("Unexpected error during synthesis: %s", e)
-            return f"Error recalling memories: {e}"
+    client = get_client()
+    try:
+        response = await client.post(
+            f"{base_url}/chat/completions",
+            json={
+                "model": "memory",
+                "messages": [
+                    {"role": "system", "content": SYNTHESIS_PROMPT},
+                    {"role": "user", "content": user_message},
+                ],
+                "temperature": 0.3,
+                "max_tokens": max_tokens,
+            },
+            timeout=120.0,
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        msg = data["choices"][0]["message"]
+        content = msg.get("content") or msg.get("reasoning_content") or ""
+        # Strip thinking tags if present (fallback)
+        content = _THINK_RE.sub("", content).strip()
+        return content
+
+    except httpx.HTTPError as e:
+        logger.error("HTTP error during synthesis: %s", e)
+        return f"Error recalling memories: {e}"
+    except Exception as e:
+        logger.error("Unexpected error during synthesis: %s", e)
+        return f"Error recalling memories: {e}"
@@ -5,16 +5,76 @@ import logging
 import os
 import sys
 import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
 
+import numpy as np
+import orjson
 import yaml
 from aiohttp import web
 
-from . import db, ingestion, recall
-from .embeddings import compute_embedding, cosine_similarity, deserialize_embedding
+try:
+    from yaml import CSafeLoader as _YamlLoader  # libyaml, ~10x faster parse
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+try:
+    from blake3 import blake3 as _query_hash
+except ImportError:
+    from hashlib import blake2b as _query_hash
+
+from . import db, httpclient, ingestion, recall, vecindex
+from .embeddings import compute_embedding
 
 logger = logging.getLogger("memory-cortex")
 
 
+def ojson_response(obj, status: int = 200) -> web.Response:
+    """json_response via orjson: SIMD parse/serialize and native NumPy
+    scalars (no float() conversions on the scoring paths)."""
+    return web.Response(
+        body=orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY),
+        status=status,
+        content_type="application/json",
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class ServerCfg:
+    """Config values handlers touch per request, flattened once at startup.
+
+    Attribute reads replace the nested dict chains the handlers used to
+    re-resolve on every call.
+    """
+    db_path: str
+    base_url: str
+    embed_url: str
+    top_k: int
+    max_results: int
+    max_synthesis_tokens: int
+    chunk_size: int
+    chunk_overlap: int
+    debounce_secs: float
+
+    @classmethod
+    def from_config(cls, config: dict) -> "ServerCfg":
+        recall_cfg = config["recall"]
+        ingestion_cfg = config["ingestion"]
+        return cls(
+            db_path=config["database"]["path"],
+            base_url=config["model"]["base_url"],
+            embed_url=config.get("embeddings", {}).get(
+                "url", "http://localhost:8105/embed"),
+            top_k=recall_cfg["top_k"],
+            max_results=recall_cfg["max_results"],
+            max_synthesis_tokens=recall_cfg["max_synthesis_tokens"],
+            chunk_size=ingestion_cfg["chunk_size"],
+            chunk_overlap=ingestion_cfg["chunk_overlap"],
+            debounce_secs=ingestion_cfg["debounce_seconds"],
+        )
+
+
 def load_config(config_path: str = None) -> dict:
     """Load configuration from YAML file."""
     if config_path is None:
@@ -22,19 +82,91 @@ def load_config(config_path: str = None) -> dict:
             os.path.dirname(os.path.dirname(__file__)), "config", "config.yaml"
         )
     with open(config_path) as f:
-        return yaml.safe_load(f)
-
-
-# Debounce tracking for ingestion
-_debounce_tasks: dict[str, asyncio.Task] = {}
+        return yaml.load(f, Loader=_YamlLoader)
+
+
+# Debounce tracking for ingestion: each key holds (deadline, ingest coro
+# factory) and one long-lived worker task polls the deadline. Repeat POSTs
+# within the window are a dict write, not a task cancel/recreate cycle.
+_debounce_state: dict[str, tuple[float, Callable[[], Awaitable[None]]]] = {}
+_debounce_workers: dict[str, asyncio.Task] = {}
+
+
+async def _debounce_worker(key: str) -> None:
+    """Run the pending ingest for `key` once its deadline stops moving."""
+    loop = asyncio.get_running_loop()
+    while True:
+        deadline, _ = _debounce_state[key]
+        wait = deadline - loop.time()
+        if wait <= 0:
+            break
+        await asyncio.sleep(wait)
+    # Clear state before running so a POST landing mid-ingest starts a
+    # fresh debounce window rather than being swallowed
+    _, do_ingest = _debounce_state.pop(key)
+    _debounce_workers.pop(key, None)
+    await do_ingest()
+
+# LRU of query embeddings: the remote embed call is the slowest step in
+# hybrid search, and hot queries repeat
+_query_emb_cache: "OrderedDict[str, list[float]]" = OrderedDict()
+_query_emb_cache_lock = asyncio.Lock()
+_QUERY_EMB_CACHE_SIZE = 1024
+
+
+async def get_query_embedding(query: str,
+                              embed_url: str) -> Optional[list[float]]:
+    """Compute a query embedding through a bounded process-level LRU.
+
+    Keyed on a fast hash of the normalized query text, so repeated queries
+    skip the network + inference round trip entirely. Failures are not
+    cached.
+    """
+    key = _query_hash(query.strip().lower().encode()).hexdigest()
+    async with _query_emb_cache_lock:
+        cached = _query_emb_cache.get(key)
+        if cached is not None:
+            _query_emb_cache.move_to_end(key)
+            return cached
+
+    embedding = await compute_embedding(query, embed_url=embed_url)
+    if embedding is not None:
+        async with _query_emb_cache_lock:
+            _query_emb_cache[key] = embedding
+            _query_emb_cache.move_to_end(key)
+            while len(_query_emb_cache) > _QUERY_EMB_CACHE_SIZE:
+                _query_emb_cache.popitem(last=False)
+    return embedding
+
+
+# TTL cache for db.get_stats: /health gets polled by monitors at >1 Hz and
+# /stats shares the same COUNT(*) queries; a short TTL drops the query rate
+# to one refresh per window. The lock coalesces concurrent refreshes.
+_stats_cache: Optional[tuple[float, dict]] = None
+_stats_lock = asyncio.Lock()
+_STATS_TTL = 2.0
+
+
+async def get_stats_cached(db_path: str) -> dict:
+    """db.get_stats through a short TTL cache with stampede coalescing."""
+    global _stats_cache
+    now = time.monotonic()
+    if _stats_cache is not None and now - _stats_cache[0] < _STATS_TTL:
+        return _stats_cache[1]
+    async with _stats_lock:
+        # Another waiter may have refreshed while we queued on the lock
+        now = time.monotonic()
+        if _stats_cache is not None and now - _stats_cache[0] < _STATS_TTL:
+            return _stats_cache[1]
+        stats = await asyncio.to_thread(db.get_stats, db_path)
+        _stats_cache = (time.monotonic(), stats)
+        return stats
 
 
 async def handle_health(request: web.Request) -> web.Response:
     """Health check endpoint."""
-    config = request.app["config"]
-    db_path = config["database"]["path"]
-    stats = db.get_stats(db_path)
-    return web.json_response({
+    stats = await get_stats_cached(request.app["cfg"].db_path)
+    return ojson_response({
         "status": "ok",
         "timestamp": time.time(),
         "stats": stats,
@@ -53,56 +185,52 @@ async def handle_ingest(request: web.Request) -> web.Response:
         "debounce": true         # optional, default true
     }
     """
+    cfg = request.app["cfg"]
     config = request.app["config"]
     try:
-        body = await request.json()
+        # Conversations can run to megabytes; drain the socket in 64 KiB
+        # chunks so the loop keeps scheduling between reads instead of
+        # blocking on one monolithic read
+        raw = bytearray()
+        async for chunk in request.content.iter_chunked(65536):
+            raw += chunk
+        body = orjson.loads(bytes(raw))
     except Exception:
-        return web.json_response({"error": "Invalid JSON"}, status=400)
+        return ojson_response({"error": "Invalid JSON"}, status=400)
 
     messages = body.get("messages", [])
     if not messages:
-        return web.json_response({"error": "No messages provided"}, status=400)
+        return ojson_response({"error": "No messages provided"}, status=400)
 
     session_id = body.get("session_id")
     channel = body.get("channel")
     user_id = body.get("user_id")
     should_debounce = body.get("debounce", True)
 
-    base_url = config["model"]["base_url"]
-    db_path = config["database"]["path"]
-    chunk_size = config["ingestion"]["chunk_size"]
-    chunk_overlap = config["ingestion"]["chunk_overlap"]
-    debounce_secs = config["ingestion"]["debounce_seconds"]
-
     async def do_ingest():
         result = await ingestion.ingest_conversation(
-            base_url, db_path, messages,
+            cfg.base_url, cfg.db_path, messages,
             session_id=session_id, channel=channel, user_id=user_id,
-            chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+            chunk_size=cfg.chunk_size, chunk_overlap=cfg.chunk_overlap,
             config=config,
         )
         logger.info("Ingestion complete for session=%s: %s", session_id, result)
 
     if should_debounce and session_id:
-        # Cancel previous debounce for this session
+        # Push the deadline out and let the per-session worker pick it up
         key = f"{session_id}:{channel or ''}"
-        if key in _debounce_tasks:
-            _debounce_tasks[key].cancel()
-
-        async def debounced():
-            await asyncio.sleep(debounce_secs)
-            await do_ingest()
-            _debounce_tasks.pop(key, None)
-
-        _debounce_tasks[key] = asyncio.create_task(debounced())
-        return web.json_response({
+        loop = asyncio.get_running_loop()
+        _debounce_state[key] = (loop.time() + cfg.debounce_secs, do_ingest)
+        if key not in _debounce_workers:
+            _debounce_workers[key] = asyncio.create_task(_debounce_worker(key))
+        return ojson_response({
             "status": "debounced",
-            "debounce_seconds": debounce_secs,
+            "debounce_seconds": cfg.debounce_secs,
         })
     else:
         # Run immediately in background
         asyncio.create_task(do_ingest())
-        return web.json_response({"status": "accepted"})
+        return ojson_response({"status": "accepted"})
 
 
 async def handle_recall(request: web.Request) -> web.Response:
@@ -114,31 +242,26 @@ async def handle_recall(request: web.Request) -> web.Response:
         "user_id": "...",        # optional, filter by user
     }
     """
-    config = request.app["config"]
+    cfg = request.app["cfg"]
     try:
-        body = await request.json()
+        body = orjson.loads(await request.read())
     except Exception:
-        return web.json_response({"error": "Invalid JSON"}, status=400)
+        return ojson_response({"error": "Invalid JSON"}, status=400)
 
     query = body.get("query", "").strip()
     if not query:
-        return web.json_response({"error": "No query provided"}, status=400)
+        return ojson_response({"error": "No query provided"}, status=400)
 
     user_id = body.get("user_id")
 
-    base_url = config["model"]["base_url"]
-    db_path = config["database"]["path"]
-    top_k = config["recall"]["top_k"]
-    max_results = config["recall"]["max_results"]
-    max_synthesis_tokens = config["recall"]["max_synthesis_tokens"]
-
     result = await recall.recall_memories(
-        base_url, db_path, query,
-        user_id=user_id, top_k=top_k, max_results=max_results,
-        max_synthesis_tokens=max_synthesis_tokens,
+        cfg.base_url, cfg.db_path, query,
+        user_id=user_id, top_k=cfg.top_k, max_results=cfg.max_results,
+        max_synthesis_tokens=cfg.max_synthesis_tokens,
+        embed_url=cfg.embed_url,
     )
 
-    return web.json_response(result)
+    return ojson_response(result)
 
 
 async def handle_search(request: web.Request) -> web.Response:
@@ -146,18 +269,18 @@ async def handle_search(request: web.Request) -> web.Response:
 
     GET /search?q=...&user_id=...&limit=20
     """
-    config = request.app["config"]
     query = request.query.get("q", "").strip()
     if not query:
-        return web.json_response({"error": "No query (q) provided"}, status=400)
+        return ojson_response({"error": "No query (q) provided"}, status=400)
 
     user_id = request.query.get("user_id")
     limit = int(request.query.get("limit", "20"))
 
-    db_path = config["database"]["path"]
-    results = db.search_memories(db_path, query, user_id=user_id, limit=limit)
+    results = await asyncio.to_thread(
+        db.search_memories, request.app["cfg"].db_path, query, user_id, limit
+    )
 
-    return web.json_response({"results": results, "count": len(results)})
+    return ojson_response({"results": results, "count": len(results)})
 
 
 async def handle_recent(request: web.Request) -> web.Response:
@@ -165,14 +288,14 @@ async def handle_recent(request: web.Request) -> web.Response:
 
     GET /recent?user_id=...&limit=10
     """
-    config = request.app["config"]
     user_id = request.query.get("user_id")
     limit = int(request.query.get("limit", "10"))
 
-    db_path = config["database"]["path"]
-    results = db.get_recent_memories(db_path, user_id=user_id, limit=limit)
+    results = await asyncio.to_thread(
+        db.get_recent_memories, request.app["cfg"].db_path, user_id, limit
+    )
 
-    return web.json_response({"results": results, "count": len(results)})
+    return ojson_response({"results": results, "count": len(results)})
 
 
 async def handle_store(request: web.Request) -> web.Response:
@@ -186,16 +309,15 @@ async def handle_store(request: web.Request) -> web.Response:
         "importance": 5
     }
     """
-    config = request.app["config"]
     try:
-        body = await request.json()
+        body = orjson.loads(await request.read())
     except Exception:
-        return web.json_response({"error": "Invalid JSON"}, status=400)
+        return ojson_response({"error": "Invalid JSON"}, status=400)
 
     fact = body.get("fact", "").strip()
     topic = body.get("topic", "").strip()
     if not fact or not topic:
-        return web.json_response(
+        return ojson_response(
             {"error": "Both 'fact' and 'topic' are required"}, status=400
         )
 
@@ -206,10 +328,11 @@ async def handle_store(request: web.Request) -> web.Response:
         "importance": body.get("importance", 5),
     }
 
-    db_path = config["database"]["path"]
-    count, _ids = db.store_memories(db_path, [memory])
+    count, _ids = await asyncio.to_thread(
+        db.store_memories, request.app["cfg"].db_path, [memory]
+    )
 
-    return web.json_response({"status": "stored", "count": count})
+    return ojson_response({"status": "stored", "count": count})
 
 
 async def handle_stats(request: web.Request) -> web.Response:
@@ -217,10 +340,8 @@ async def handle_stats(request: web.Request) -> web.Response:
 
     GET /stats
     """
-    config = request.app["config"]
-    db_path = config["database"]["path"]
-    stats = db.get_stats(db_path)
-    return web.json_response(stats)
+    stats = await get_stats_cached(request.app["cfg"].db_path)
+    return ojson_response(stats)
 
 
 async def handle_hybrid_search(request: web.Request) -> web.Response:
@@ -233,86 +354,127 @@ async def handle_hybrid_search(request: web.Request) -> web.Response:
         "limit": 10              # optional, default 10
     }
     """
-    config = request.app["config"]
+    cfg = request.app["cfg"]
     try:
-        body = await request.json()
+        body = orjson.loads(await request.read())
     except Exception:
-        return web.json_response({"error": "Invalid JSON"}, status=400)
+        return ojson_response({"error": "Invalid JSON"}, status=400)
 
     query = body.get("query", "").strip()
     if not query:
-        return web.json_response({"error": "No query provided"}, status=400)
+        return ojson_response({"error": "No query provided"}, status=400)
 
     user_id = body.get("user_id")
     limit = body.get("limit", 10)
 
-    db_path = config["database"]["path"]
-    embed_url = config.get("embeddings", {}).get("url", "http://localhost:8105/embed")
-
-    # 1. FTS5 keyword search
-    fts_results = db.search_memories(db_path, query, user_id=user_id, limit=limit * 2)
-
-    # Normalize FTS5 ranks to 0-1 (rank is negative, lower = better match)
+    # 1. FTS5 keyword search and the query embedding have no data
+    # dependency; overlap them so wall time is max() of the legs, not the sum
+    fts_results, query_embedding = await asyncio.gather(
+        asyncio.to_thread(db.search_memories, cfg.db_path, query, user_id,
+                          limit * 2),
+        get_query_embedding(query, cfg.embed_url),
+        return_exceptions=True,
+    )
+    if isinstance(fts_results, BaseException):
+        raise fts_results
+    if isinstance(query_embedding, BaseException):
+        logger.warning("Query embedding failed, falling back to FTS5 only: %s",
+                       query_embedding)
+        query_embedding = None
+
+    # Normalize FTS5 ranks to 0-1 (rank is negative, lower = better match).
+    # One vectorized pass: best match (most negative) gets score 1.0
     fts_scores: dict[int, float] = {}
     if fts_results:
-        ranks = [r["rank"] for r in fts_results]
-        min_rank = min(ranks)  # Most negative = best match
-        max_rank = max(ranks)  # Least negative = worst match
-        rank_range = max_rank - min_rank
-        for r in fts_results:
-            if rank_range != 0:
-                # Invert: best match (most negative) gets score 1.0
-                fts_scores[r["id"]] = 1.0 - (r["rank"] - min_rank) / rank_range
-            else:
-                fts_scores[r["id"]] = 1.0
+        ranks = np.fromiter((r["rank"] for r in fts_results),
+                            dtype=np.float32, count=len(fts_results))
+        lo = ranks.min()
+        rank_range = ranks.max() - lo
+        if rank_range != 0:
+            norm = 1.0 - (ranks - lo) / rank_range
+        else:
+            norm = np.ones_like(ranks)
+        fts_scores = dict(zip((r["id"] for r in fts_results), norm.tolist()))
 
     # Build lookup of FTS results by ID
     fts_by_id: dict[int, dict] = {r["id"]: r for r in fts_results}
 
-    # 2. Vector search
+    # 2. Vector search against the shared in-process index: one matmul over
+    # the cached embedding matrix instead of per-row deserialize + cosine
     vector_scores: dict[int, float] = {}
-    vector_by_id: dict[int, dict] = {}
     source_label = "fts5"
 
     try:
-        query_embedding = await compute_embedding(query, embed_url=embed_url)
         if query_embedding is not None:
             source_label = "fts5+vector"
-            mem_rows = db.get_memories_with_embeddings(
-                db_path, user_id=user_id, limit=500
+            # The index isn't user-partitioned, so a filtered search must
+            # oversample and drop other users' hits *before* fusion and the
+            # top-k cut, or they silently consume all the candidate slots
+            k = limit * 10 if user_id else limit * 2
+            hits = await asyncio.to_thread(
+                vecindex.ann_search, cfg.db_path, query_embedding, k
             )
-            for row in mem_rows:
-                emb = deserialize_embedding(row["embedding"])
-                if emb is not None:
-                    sim = cosine_similarity(query_embedding, emb)
-                    # Normalize cosine similarity from [-1,1] to [0,1]
-                    score = (sim + 1.0) / 2.0
-                    vector_scores[row["id"]] = score
-                    vector_by_id[row["id"]] = row
+            unknown = [mid for mid, _sim in hits if mid not in fts_by_id]
+            if unknown:
+                for row in await asyncio.to_thread(
+                        db.get_memories_by_ids, cfg.db_path, unknown):
+                    fts_by_id[row["id"]] = row
+            for mid, sim in hits:
+                mem = fts_by_id.get(mid)
+                if mem is None:
+                    continue
+                if user_id and mem.get("user_id") != user_id:
+                    continue
+                # Normalize cosine similarity from [-1,1] to [0,1]
+                vector_scores[mid] = (sim + 1.0) / 2.0
     except Exception as e:
         logger.warning("Vector search failed, falling back to FTS5 only: %s", e)
 
-    # 3. Merge scores
-    all_ids = set(fts_scores.keys()) | set(vector_scores.keys())
-    scored: list[tuple[int, float]] = []
-    for mid in all_ids:
-        fts_s = fts_scores.get(mid, 0.0)
-        vec_s = vector_scores.get(mid, 0.0)
-        if vector_scores:
-            final = 0.4 * fts_s + 0.6 * vec_s
-        else:
-            final = fts_s
-        scored.append((mid, final))
+    # 3. Merge scores on dense aligned arrays, built in one pass over each
+    # dict (no id-set union, no per-id double lookups), then fuse with a
+    # vectorized weighted sum and take the top-k with argpartition instead
+    # of sorting the whole pool
+    all_ids: list[int] = []
+    fts_vals: list[float] = []
+    vec_vals: list[float] = []
+    for mid, score in fts_scores.items():
+        all_ids.append(mid)
+        fts_vals.append(score)
+        vec_vals.append(vector_scores.get(mid, 0.0))
+    for mid, score in vector_scores.items():
+        if mid not in fts_scores:
+            all_ids.append(mid)
+            fts_vals.append(0.0)
+            vec_vals.append(score)
+    fts_arr = np.asarray(fts_vals, dtype=np.float32)
+    vec_arr = np.asarray(vec_vals, dtype=np.float32)
+    if vector_scores:
+        final = 0.4 * fts_arr + 0.6 * vec_arr
+    else:
+        final = fts_arr
 
-    scored.sort(key=lambda x: x[1], reverse=True)
-    top = scored[:limit]
+    if limit < final.shape[0]:
+        idx = np.argpartition(-final, limit)[:limit]
+        idx = idx[np.argsort(-final[idx])]
+    else:
+        idx = np.argsort(-final)
+    top = [(all_ids[i], float(final[i])) for i in idx]
+
+    # 4. Build response; vector-only hits need one batched hydration SELECT
+    missing = [mid for mid, _score in top if mid not in fts_by_id]
+    if missing:
+        for row in await asyncio.to_thread(db.get_memories_by_ids, cfg.db_path,
+                                           missing):
+            fts_by_id[row["id"]] = row
 
-    # 4. Build response
     results = []
     for mid, score in top:
-        mem = fts_by_id.get(mid) or vector_by_id.get(mid)
+        mem = fts_by_id.get(mid)
         if mem is None:
             continue
+        # The vector index isn't user-partitioned; enforce the filter here
+        if user_id and mem.get("user_id") != user_id:
+            continue
         results.append({
             "id": mem["id"],
             "user_id": mem.get("user_id"),
@@ -323,16 +485,20 @@ async def handle_hybrid_search(request: web.Request) -> web.Response:
             "source": source_label,
         })
 
-    return web.json_response({"results": results, "count": len(results)})
+    return ojson_response({"results": results, "count": len(results)})
 
 
 def create_app(config: dict) -> web.Application:
     """Create the aiohttp application."""
     app = web.Application()
     app["config"] = config
+    app["cfg"] = ServerCfg.from_config(config)
 
     # Initialize database
     db.init_db(config["database"]["path"])
+    vecindex.configure(
+        int8_scoring=config.get("embeddings", {}).get("int8_scoring", False)
+    )
 
     # Routes
     app.router.add_get("/health", handle_health)
@@ -344,6 +510,12 @@ def create_app(config: dict) -> web.Application:
     app.router.add_get("/stats", handle_stats)
     app.router.add_post("/hybrid-search", handle_hybrid_search)
 
+    # Drain the shared HTTP connection pool on shutdown
+    async def _close_http_client(app: web.Application) -> None:
+        await httpclient.aclose()
+
+    app.on_cleanup.append(_close_http_client)
+
     return app
 
 
@@ -354,6 +526,15 @@ def main():
         format="%(asctime)s [%(name)s] %(levelname)s: %(message)s",
     )
 
+    # libuv-backed loop cuts per-task scheduling overhead, which this server
+    # pays constantly (debounce workers, embedding calls, to_thread hops)
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("Using uvloop event loop")
+    except ImportError:
+        pass
+
     config_path = sys.argv[1] if len(sys.argv) > 1 else None
     config = load_config(config_path)
 
@@ -365,7 +546,9 @@ def main():
     logger.info("Model endpoint: %s", config["model"]["base_url"])
 
     app = create_app(config)
-    web.run_app(app, host=host, port=port, print=None)
+    # No per-request access logging: formatting lines for chatty ingest
+    # traffic costs more than the whole debounce bookkeeping
+    web.run_app(app, host=host, port=port, print=None, access_log=None)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,317 @@
+"""In-process vector index over stored memory embeddings."""
+
+import logging
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+from .embeddings import EMBEDDING_DIM, load_embedding_matrix, quantize_int8
+
+logger = logging.getLogger("memory-cortex.vecindex")
+
+# Scoring mode for newly created indexes; see configure(). int8 keeps the
+# resident matrix 4x smaller at the cost of leaving the BLAS GEMV path
+# (NumPy has no int8 GEMM kernel), so it defaults off and only pays for
+# itself when the store outgrows RAM/cache.
+_int8_scoring = False
+
+
+def configure(int8_scoring: bool) -> None:
+    """Set the scoring mode used by indexes created after this call."""
+    global _int8_scoring
+    _int8_scoring = int8_scoring
+
+
+def _sidecar_paths(db_path: str) -> tuple[str, str]:
+    """Sidecar file paths for the persisted matrix and row ids."""
+    return db_path + ".embeddings.npy", db_path + ".row_ids.npy"
+
+
+def rank_cosine(query: np.ndarray, matrix: np.ndarray,
+                norms: np.ndarray) -> np.ndarray:
+    """Cosine-score one query against a (N, D) matrix with cached row norms.
+
+    One BLAS GEMV (AVX/FMA via OpenBLAS) plus a vectorized divide; the norms
+    are precomputed once when rows enter the index rather than per query.
+    Rows with zero magnitude score 0.0.
+    """
+    q = np.asarray(query, dtype=np.float32)
+    qn = np.linalg.norm(q)
+    if qn == 0.0 or matrix.shape[0] == 0:
+        return np.zeros(matrix.shape[0], dtype=np.float32)
+
+    denom = norms * qn
+    denom = np.where(denom == 0.0, np.inf, denom)  # zero-magnitude rows -> 0.0
+    return (matrix @ q) / denom
+
+
+def rank_cosine_int8(qmat: np.ndarray, scales: np.ndarray, norms: np.ndarray,
+                     query: np.ndarray) -> np.ndarray:
+    """Cosine-score one query against int8-quantized rows.
+
+    Quantizes the query to int8, takes integer dot products accumulated in
+    int32, and rescales by the per-row and query scales before dividing by
+    the cached (dequantized) norms. Rows with zero magnitude score 0.0.
+    """
+    q = np.asarray(query, dtype=np.float32)
+    qn = np.linalg.norm(q)
+    if qn == 0.0 or qmat.shape[0] == 0:
+        return np.zeros(qmat.shape[0], dtype=np.float32)
+
+    q8, q_scale = quantize_int8(q)
+    dots = np.einsum("nd,d->n", qmat, q8, dtype=np.int32).astype(np.float32)
+    dots *= scales * np.float32(q_scale)
+
+    denom = norms * qn
+    denom = np.where(denom == 0.0, np.inf, denom)
+    return dots / denom
+
+
+def _select_top_k(sims: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Row indices and scores of the k best entries, best first.
+
+    np.argpartition selects the k winners in O(N); only those k are then
+    sorted, instead of ordering the full score array.
+    """
+    n = sims.shape[0]
+    if k >= n:
+        order = np.argsort(-sims)
+    else:
+        candidates = np.argpartition(-sims, k)[:k]
+        order = candidates[np.argsort(-sims[candidates])]
+    return order, sims[order]
+
+
+class VectorIndex:
+    """Exact cosine index over all stored embeddings, keyed by memory id.
+
+    Keeps a dense (N, D) float32 matrix with precomputed row norms and a
+    parallel id array in memory, maintained incrementally as embeddings are
+    stored. Queries run as a single BLAS GEMV over the whole store, which at
+    the store sizes this service sees (thousands of memories) beats both the
+    per-query SELECT + deserialize sweep it replaces and the bookkeeping
+    cost of an approximate structure.
+    """
+
+    # Buffers grow by doubling so appends are O(1) amortized; _size rows of
+    # the (possibly larger, possibly memory-mapped) buffers are live
+    _MIN_CAPACITY = 64
+
+    def __init__(self, dim: int = EMBEDDING_DIM, int8: Optional[bool] = None):
+        self.dim = dim
+        self.int8 = _int8_scoring if int8 is None else int8
+        self._lock = threading.Lock()
+        dtype = np.int8 if self.int8 else np.float32
+        self._matrix = np.empty((0, dim), dtype=dtype)
+        self._scales = np.empty(0, dtype=np.float32)  # int8 mode only
+        self._norms = np.empty(0, dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._pos: dict[int, int] = {}  # memory id -> live row
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _view(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Live rows of the backing buffers. Caller must hold the lock."""
+        return (self._matrix[:self._size], self._scales[:self._size],
+                self._norms[:self._size], self._ids[:self._size])
+
+    def _grow(self, min_capacity: int) -> None:
+        """Reallocate the backing buffers to at least min_capacity rows.
+
+        Also materializes memory-mapped (read-only) buffers into writable
+        memory the first time an append lands on a warm-started index.
+        Caller must hold the lock.
+        """
+        capacity = max(self._MIN_CAPACITY, self._matrix.shape[0])
+        while capacity < min_capacity:
+            capacity *= 2
+        matrix = np.empty((capacity, self.dim), dtype=self._matrix.dtype)
+        scales = np.empty(capacity, dtype=np.float32)
+        norms = np.empty(capacity, dtype=np.float32)
+        ids = np.empty(capacity, dtype=np.int64)
+        matrix[:self._size] = self._matrix[:self._size]
+        scales[:self._size] = self._scales[:self._size]
+        norms[:self._size] = self._norms[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._scales, self._norms, self._ids = \
+            matrix, scales, norms, ids
+
+    def load(self, db_path: str) -> int:
+        """Load the index, preferring the memory-mapped sidecar files.
+
+        A warm start memmaps the persisted (N, D) matrix and id array and
+        only deserializes blobs stored since the last save; cold starts (no
+        or stale sidecar) rebuild from the database. Returns the row count.
+        """
+        from . import db
+
+        matrix, ids = self._load_sidecar(db_path)
+
+        if matrix is None:
+            # Cold start: rebuild everything from stored blobs
+            rows = db.get_embedding_rows(db_path)
+            matrix, id_list = load_embedding_matrix(rows, self.dim)
+            ids = np.asarray(id_list, dtype=np.int64)
+        else:
+            # Warm start: only blobs newer than the sidecar need per-row work
+            max_id = int(ids.max()) if ids.size else 0
+            new_rows = db.get_embedding_rows(db_path, since_id=max_id)
+            if new_rows:
+                new_matrix, new_ids = load_embedding_matrix(new_rows, self.dim)
+                matrix = np.vstack([matrix, new_matrix])
+                ids = np.concatenate([ids, np.asarray(new_ids, dtype=np.int64)])
+
+        norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+        if self.int8:
+            scales = (np.abs(matrix).max(axis=1) / 127.0).astype(np.float32)
+            scales[scales == 0.0] = 1.0
+            matrix = np.round(matrix / scales[:, np.newaxis]).astype(np.int8)
+        else:
+            scales = np.ones(matrix.shape[0], dtype=np.float32)
+        with self._lock:
+            self._matrix = matrix
+            self._scales = scales
+            self._norms = norms
+            self._ids = ids
+            self._pos = {int(mid): i for i, mid in enumerate(ids)}
+            self._size = int(ids.shape[0])
+        logger.info("Vector index loaded: %d embeddings", ids.shape[0])
+        return int(ids.shape[0])
+
+    def _load_sidecar(self, db_path: str) -> tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Memmap the persisted matrix if present and consistent with the db."""
+        from . import db
+
+        vec_path, ids_path = _sidecar_paths(db_path)
+        if not (os.path.exists(vec_path) and os.path.exists(ids_path)):
+            return None, None
+        try:
+            matrix = np.load(vec_path, mmap_mode="r")
+            ids = np.load(ids_path)
+        except Exception as e:
+            logger.warning("Failed to load vector sidecar, rebuilding: %s", e)
+            return None, None
+
+        if (matrix.ndim != 2 or matrix.shape[1] != self.dim
+                or matrix.shape[0] != ids.shape[0]):
+            logger.warning("Vector sidecar shape mismatch, rebuilding")
+            return None, None
+
+        # Stale sidecar (e.g. rows deleted or db replaced): row counts up to
+        # the sidecar's last id must agree
+        max_id = int(ids.max()) if ids.size else 0
+        if db.count_embeddings(db_path, up_to_id=max_id) != ids.shape[0]:
+            logger.warning("Vector sidecar out of sync with database, rebuilding")
+            return None, None
+
+        return matrix, ids.astype(np.int64)
+
+    def save(self, db_path: str) -> None:
+        """Persist the matrix and id array as sidecar files atomically.
+
+        The sidecar stays float32 regardless of scoring mode, so the files
+        remain valid when the int8 flag is toggled.
+        """
+        with self._lock:
+            if self.int8:
+                matrix = (self._matrix[:self._size].astype(np.float32)
+                          * self._scales[:self._size, np.newaxis])
+            else:
+                matrix = np.asarray(self._matrix[:self._size])
+            ids = self._ids[:self._size].copy()
+
+        vec_path, ids_path = _sidecar_paths(db_path)
+        try:
+            for path, arr in ((vec_path, matrix), (ids_path, ids)):
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, arr)
+                os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Failed to persist vector sidecar: %s", e)
+
+    def add(self, memory_id: int, embedding: np.ndarray) -> None:
+        """Add one embedding, overwriting in place if the id is indexed.
+
+        The store functions call this after committing, and a lazy load()
+        on the same call may already have read the committed row; keying on
+        the id keeps that (and re-embeds of existing memories) from
+        appending duplicate rows that crowd top-k and double-count in RRF.
+        """
+        vec = np.asarray(embedding, dtype=np.float32)
+        if vec.shape != (self.dim,):
+            logger.warning(
+                "Skipping index add for memory %d: shape %s != (%d,)",
+                memory_id, vec.shape, self.dim,
+            )
+            return
+        with self._lock:
+            row = self._pos.get(memory_id)
+            if row is None:
+                full = self._size == self._matrix.shape[0]
+                if full or not self._matrix.flags.writeable:
+                    self._grow(self._size + 1)
+                row = self._size
+                self._ids[row] = memory_id
+                self._pos[memory_id] = row
+                self._size += 1
+            elif not self._matrix.flags.writeable:
+                self._grow(self._size)
+            if self.int8:
+                quantized, scale = quantize_int8(vec)
+                self._matrix[row] = quantized
+                self._scales[row] = scale
+            else:
+                self._matrix[row] = vec
+                self._scales[row] = 1.0
+            self._norms[row] = np.linalg.norm(vec)
+
+    def search(self, query: np.ndarray, k: int) -> list[tuple[int, float]]:
+        """Return the k nearest memories as (memory_id, cosine_sim) pairs."""
+        with self._lock:
+            matrix, scales, norms, ids = self._view()
+        if matrix.shape[0] == 0:
+            return []
+
+        if self.int8:
+            sims = rank_cosine_int8(matrix, scales, norms, query)
+        else:
+            sims = rank_cosine(query, matrix, norms)
+        order, scores = _select_top_k(sims, k)
+        if not scores.any():
+            return []
+
+        return [(int(ids[i]), float(s)) for i, s in zip(order, scores)]
+
+
+_indexes: dict[str, VectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(db_path: str) -> VectorIndex:
+    """Get (lazily building) the shared index for a database path."""
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None:
+            index = VectorIndex()
+            _indexes[db_path] = index
+            needs_load = True
+        else:
+            needs_load = False
+    if needs_load:
+        index.load(db_path)
+    return index
+
+
+def ann_search(db_path: str, query: np.ndarray, k: int) -> list[tuple[int, float]]:
+    """Nearest-neighbor search against the shared index for db_path."""
+    return get_index(db_path).search(query, k)
+
+
+def save_index(db_path: str) -> None:
+    """Persist the shared index for db_path to its sidecar files."""
+    get_index(db_path).save(db_path)
@@ -1,42 +1,58 @@
-#!/usr/bin/env python3
-"""One-time script to compute embeddings for all existing memories."""
-
-import asyncio
-import os
-import sys
-
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-
-from middleware.db import get_memories_without_embeddings, store_embedding, init_db
-from middleware.embeddings import compute_embedding, serialize_embedding
-
-
-async def backfill(
-    db_path="/home/mferr/.openclaw/memory-cortex/memories.db",
-    embed_url="http://localhost:8105/embed",
-):
-    # Ensure the embedding column exists
-    init_db(db_path)
-
-    memories = get_memories_without_embeddings(db_path)
-    print(f"Found {len(memories)} memories without embeddings")
-
-    success = 0
-    failed = 0
-    for mem in memories:
-        text = f"{mem['topic']}: {mem['fact']}"
-        embedding = await compute_embedding(text, embed_url)
-        if embedding:
-            blob = serialize_embedding(embedding)
-            store_embedding(db_path, mem["id"], blob)
-            print(f"  [{mem['id']}] Embedded: {mem['fact'][:60]}...")
-            success += 1
-        else:
-            print(f"  [{mem['id']}] FAILED: {mem['fact'][:60]}...")
-            failed += 1
-
-    print(f"Backfill complete: {success} succeeded, {failed} failed")
-
-
-if __name__ == "__main__":
-    asyncio.run(backfill())
+#!/usr/bin/env python3
+"""One-time script to compute embeddings for all existing memories."""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from middleware.db import (
+    bulk_write,
+    get_memories_without_embeddings,
+    init_db,
+    store_embeddings_batch,
+)
+from middleware.embeddings import compute_embeddings_batch, serialize_embedding
+
+# Texts per embedding request: one HTTP round trip per batch instead of per
+# memory, and the embed service batches the GPU forward pass
+BATCH_SIZE = 128
+
+
+async def backfill(
+    db_path="/home/mferr/.openclaw/memory-cortex/memories.db",
+    embed_url="http://localhost:8105/embed",
+):
+    # Ensure the embedding column exists
+    init_db(db_path)
+
+    memories = get_memories_without_embeddings(db_path)
+    print(f"Found {len(memories)} memories without embeddings")
+
+    success = 0
+    failed = 0
+    # Relaxed durability for the whole run: one bulk load, no fsync per batch
+    with bulk_write(db_path):
+        for start in range(0, len(memories), BATCH_SIZE):
+            batch = memories[start:start + BATCH_SIZE]
+            texts = [f"{m['topic']}: {m['fact']}" for m in batch]
+            embeddings = await compute_embeddings_batch(texts, embed_url)
+
+            to_store = []
+            for mem, embedding in zip(batch, embeddings):
+                if embedding:
+                    to_store.append((mem["id"], serialize_embedding(embedding)))
+                    success += 1
+                else:
+                    print(f"  [{mem['id']}] FAILED: {mem['fact'][:60]}...")
+                    failed += 1
+
+            store_embeddings_batch(db_path, to_store)
+            print(f"  {min(start + BATCH_SIZE, len(memories))}/{len(memories)} processed")
+
+    print(f"Backfill complete: {success} succeeded, {failed} failed")
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill())